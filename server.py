@@ -1,18 +1,45 @@
 from flask import Flask, request, jsonify, send_file, Response, make_response, redirect
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
 import os
+import hashlib
 import re
 import logging
-import tempfile
 import time
-import urllib.request
-import json
-import subprocess
-import sys
-import shutil
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Serialize JSON with orjson instead of the stdlib json module
+class OrjsonProvider(DefaultJSONProvider):
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        option = 0
+        if kwargs.pop("sort_keys", self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        indent = kwargs.pop("indent", None)
+        if indent is not None:
+            if indent != 2:
+                raise TypeError("orjson only supports an indent of 2")
+            option |= orjson.OPT_INDENT_2
+        # orjson output is always compact
+        if kwargs.pop("separators", (",", ":")) != (",", ":"):
+            raise TypeError("orjson only supports compact separators")
+        default = kwargs.pop("default", self.default)
+        if kwargs:
+            raise TypeError(f"Unsupported arguments for orjson: {', '.join(kwargs)}")
+        return orjson.dumps(obj, default=default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            raise TypeError(f"Unsupported arguments for orjson: {', '.join(kwargs)}")
+        return orjson.loads(s)
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)  # Enable CORS for all routes
 
 # Configure logging
@@ -21,53 +48,181 @@ logger = logging.getLogger(__name__)
 
 # Create downloads directory
 DOWNLOADS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'downloads')
-if not os.path.exists(DOWNLOADS_DIR):
-    os.makedirs(DOWNLOADS_DIR)
+os.makedirs(DOWNLOADS_DIR, exist_ok=True)
+
+# Shared HTTP session so fallback requests reuse pooled keep-alive connections
+_HTTP = requests.Session()
+_HTTP.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=20))
+
+# (connect, read) timeouts in seconds for outbound HTTP calls
+HTTP_TIMEOUT = (3, 5)
+
+# Worker pool for stream file size lookups. Each lookup is bounded by
+# HTTP_TIMEOUT, so threads are always returned to the pool.
+_EXECUTOR = ThreadPoolExecutor(max_workers=16)
+
+# Total time to wait for a video's stream file sizes, in seconds
+FILESIZE_TIMEOUT = 8
+
+# Single alternation covering every supported URL form, compiled once at import.
+# Group 1 holds the ID from a URL, group 2 a bare video ID.
+_VIDEO_ID_RE = re.compile(
+    r'(?:youtube\.com\/(?:[^\/]+\/.+\/|(?:v|e(?:mbed)?)\/|.*[?&]v=|shorts\/)|youtu\.be\/)([^"&?\/\s]{11})'
+    r'|^([a-zA-Z0-9_-]{11})$'  # Just the video ID
+)
+
+# Characters allowed in a bare video ID
+_VIDEO_ID_CHARS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-')
 
 # Function to extract video ID from various URL formats
 def extract_video_id(url):
-    # Try different patterns
-    patterns = [
-        r'(?:youtube\.com\/(?:[^\/]+\/.+\/|(?:v|e(?:mbed)?)\/|.*[?&]v=)|youtu\.be\/)([^"&?\/\s]{11})',
-        r'youtu\.be\/([^"&?\/\s]{11})',
-        r'youtube\.com\/embed\/([^"&?\/\s]{11})',
-        r'youtube\.com\/shorts\/([^"&?\/\s]{11})',
-        r'youtube\.com\/v\/([^"&?\/\s]{11})',
-        r'^([a-zA-Z0-9_-]{11})$'  # Just the video ID
-    ]
+    # Fast path: the input is already a bare video ID
+    if len(url) == 11 and _VIDEO_ID_CHARS.issuperset(url):
+        return url
     
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match:
-            return match.group(1)
+    match = _VIDEO_ID_RE.search(url)
+    if match:
+        return match.group(1) or match.group(2)
     
     return None
 
-# Install pytube if not already installed
-def ensure_pytube_installed():
-    try:
-        import pytube
-        logger.info("PyTube is already installed")
-        return True
-    except ImportError:
-        logger.info("PyTube not found, installing...")
-        try:
-            subprocess.check_call([sys.executable, "-m", "pip", "install", "pytube"])
-            logger.info("PyTube installed successfully")
-            return True
-        except Exception as e:
-            logger.error(f"Failed to install PyTube: {str(e)}")
-            return False
-
-# Make sure PyTube is installed
-ensure_pytube_installed()
-
-# Now import PyTube
-try:
-    from pytube import YouTube
-    logger.info("Successfully imported PyTube")
-except ImportError as e:
-    logger.error(f"Failed to import PyTube: {str(e)}")
+# Default formats reported when only oEmbed data is available
+_FALLBACK_FORMATS = (
+    {
+        "itag": "18",  # Default for 360p
+        "mimeType": "video/mp4",
+        "qualityLabel": "360p",
+        "bitrate": 0,
+        "hasVideo": True,
+        "hasAudio": True,
+        "container": "mp4",
+        "contentLength": "0"
+    },
+    {
+        "itag": "140",  # Default for audio
+        "mimeType": "audio/mp4",
+        "qualityLabel": "Audio Only",
+        "bitrate": 128000,
+        "hasVideo": False,
+        "hasAudio": True,
+        "container": "mp4",
+        "contentLength": "0"
+    }
+)
+
+# Return a cached value, or None if missing or older than ttl seconds.
+# Each cache is a dict of key -> (timestamp, value) guarded by its own lock.
+def cache_get(cache, lock, key, ttl):
+    with lock:
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > ttl:
+            del cache[key]
+            return None
+        return entry[1]
+
+# Store a value in a cache, evicting the oldest entry once max_entries is reached
+def cache_set(cache, lock, key, value, max_entries):
+    with lock:
+        cache.pop(key, None)
+        if len(cache) >= max_entries:
+            del cache[next(iter(cache))]
+        cache[key] = (time.monotonic(), value)
+
+# How long oEmbed responses stay cached, in seconds
+OEMBED_CACHE_TTL = 300
+OEMBED_CACHE_MAX_ENTRIES = 1024
+
+# video_id -> (timestamp, oEmbed data)
+_oembed_cache = {}
+_oembed_cache_lock = threading.Lock()
+
+# Fetch oEmbed data for a video, cached per video ID for OEMBED_CACHE_TTL seconds
+def fetch_oembed(video_id):
+    cached = cache_get(_oembed_cache, _oembed_cache_lock, video_id, OEMBED_CACHE_TTL)
+    if cached is not None:
+        return cached
+    
+    oembed_url = f"https://www.youtube.com/oembed?url=https://www.youtube.com/watch?v={video_id}&format=json"
+    
+    oembed_response = _HTTP.get(oembed_url, timeout=HTTP_TIMEOUT)
+    oembed_response.raise_for_status()
+    oembed_data = orjson.loads(oembed_response.content)
+    cache_set(_oembed_cache, _oembed_cache_lock, video_id, oembed_data, OEMBED_CACHE_MAX_ENTRIES)
+    return oembed_data
+
+# How long PyTube video info stays cached, in seconds
+INFO_CACHE_TTL = 600
+INFO_CACHE_MAX_ENTRIES = 1024
+
+# video_id -> (timestamp, (JSON body, ETag))
+_info_cache = {}
+_info_cache_lock = threading.Lock()
+
+# Return the cached (body, etag) for a video, or None if missing or expired
+def get_cached_info(video_id):
+    return cache_get(_info_cache, _info_cache_lock, video_id, INFO_CACHE_TTL)
+
+# Serialize video info once, cache the body with its ETag and return both
+def set_cached_info(video_id, info):
+    body = orjson.dumps(info)
+    etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+    cache_set(_info_cache, _info_cache_lock, video_id, (body, etag), INFO_CACHE_MAX_ENTRIES)
+    return body, etag
+
+# Return a stream's size in bytes. PyTube's own stream.filesize sends its HEAD
+# request without a timeout, so look it up through the shared session instead.
+def get_stream_filesize(stream):
+    # PyTube already knows the size when the stream data includes contentLength
+    if getattr(stream, '_filesize', 0):
+        return stream._filesize
+    
+    head_response = _HTTP.head(stream.url, timeout=HTTP_TIMEOUT, allow_redirects=True)
+    head_response.raise_for_status()
+    return int(head_response.headers['Content-Length'])
+
+# Look up file sizes for several streams at once. Sizes that fail or don't
+# arrive within FILESIZE_TIMEOUT are returned as None.
+def get_stream_filesizes(streams):
+    futures = [_EXECUTOR.submit(get_stream_filesize, stream) for stream in streams]
+    done, not_done = wait(futures, timeout=FILESIZE_TIMEOUT)
+    for future in not_done:
+        future.cancel()
+    
+    filesizes = []
+    for stream, future in zip(streams, futures):
+        if future not in done:
+            logger.warning(f"Timed out fetching file size for itag {stream.itag}")
+            filesizes.append(None)
+        elif future.exception() is not None:
+            logger.warning(f"Failed to fetch file size for itag {stream.itag}: {str(future.exception())}")
+            filesizes.append(None)
+        else:
+            filesizes.append(future.result())
+    return filesizes
+
+# PyTube is installed from requirements.txt. It is imported on first use so
+# endpoints that never touch it don't pay for the import.
+_YouTube = None
+
+def get_youtube_class():
+    global _YouTube
+    if _YouTube is None:
+        from pytube import YouTube
+        logger.info("Successfully imported PyTube")
+        _YouTube = YouTube
+    return _YouTube
+
+# How long clients may reuse a video info response, in seconds
+INFO_MAX_AGE = 300
+
+# Build a video info response with an ETag, answering 304 if the client has it
+def info_response(body, etag):
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={INFO_MAX_AGE}'
+    return response.make_conditional(request)
 
 @app.route('/api/info', methods=['GET'])
 def get_video_info():
@@ -85,23 +240,30 @@ def get_video_info():
         if not video_id:
             return jsonify({"error": "Could not extract video ID from URL"}), 400
         
+        cached = get_cached_info(video_id)
+        if cached is not None:
+            logger.info(f"Serving cached video info for: {video_id}")
+            return info_response(*cached)
+        
         # Construct a clean URL
         clean_url = f"https://www.youtube.com/watch?v={video_id}"
         logger.info(f"Using clean URL: {clean_url}")
         
         # Create YouTube object
-        yt = YouTube(clean_url)
+        yt = get_youtube_class()(clean_url)
         
         # Get available streams
-        streams = yt.streams.filter(progressive=True).order_by('resolution').desc()
-        audio_streams = yt.streams.filter(only_audio=True).order_by('abr').desc()
+        streams = list(yt.streams.filter(progressive=True).order_by('resolution').desc())
+        audio_streams = list(yt.streams.filter(only_audio=True).order_by('abr').desc())[:1]  # Just use the highest quality audio
         
-        # Format the streams data
-        formats = []
+        # Fetch file sizes concurrently; missing ones are reported as 0
+        filesizes = get_stream_filesizes(streams + audio_streams)
+        sizes_complete = None not in filesizes
+        filesizes = [filesize or 0 for filesize in filesizes]
         
-        # Add video formats
-        for stream in streams:
-            formats.append({
+        # Format the streams data
+        video_formats = [
+            {
                 "itag": stream.itag,
                 "mimeType": f"video/{stream.subtype}",
                 "qualityLabel": stream.resolution,
@@ -109,12 +271,12 @@ def get_video_info():
                 "hasVideo": True,
                 "hasAudio": True,
                 "container": stream.subtype,
-                "contentLength": stream.filesize
-            })
-        
-        # Add audio formats
-        for stream in audio_streams[:1]:  # Just add the highest quality audio
-            formats.append({
+                "contentLength": filesize
+            }
+            for stream, filesize in zip(streams, filesizes)
+        ]
+        audio_formats = [
+            {
                 "itag": stream.itag,
                 "mimeType": f"audio/{stream.subtype}",
                 "qualityLabel": "Audio Only",
@@ -122,8 +284,11 @@ def get_video_info():
                 "hasVideo": False,
                 "hasAudio": True,
                 "container": stream.subtype,
-                "contentLength": stream.filesize
-            })
+                "contentLength": filesize
+            }
+            for stream, filesize in zip(audio_streams, filesizes[len(streams):])
+        ]
+        formats = video_formats + audio_formats
         
         # Prepare the response
         response = {
@@ -138,7 +303,13 @@ def get_video_info():
         
         logger.info(f"Successfully fetched video info for: {yt.title}")
         
-        return jsonify(response)
+        if not sizes_complete:
+            # Some sizes are placeholders, so don't cache this response anywhere
+            partial_response = jsonify(response)
+            partial_response.headers['Cache-Control'] = 'no-store'
+            return partial_response
+        
+        return info_response(*set_cached_info(video_id, response))
     
     except Exception as e:
         logger.error(f"Error fetching video info: {str(e)}")
@@ -146,35 +317,9 @@ def get_video_info():
         # Try fallback method with oEmbed API
         try:
             logger.info('Falling back to oEmbed API')
-            oembed_url = f"https://www.youtube.com/oembed?url=https://www.youtube.com/watch?v={video_id}&format=json"
-            
-            with urllib.request.urlopen(oembed_url) as response:
-                oembed_data = json.loads(response.read().decode())
+            oembed_data = fetch_oembed(video_id)
             
             # Create a simplified response with the available data
-            formats = [
-                {
-                    "itag": "18",  # Default for 360p
-                    "mimeType": "video/mp4",
-                    "qualityLabel": "360p",
-                    "bitrate": 0,
-                    "hasVideo": True,
-                    "hasAudio": True,
-                    "container": "mp4",
-                    "contentLength": "0"
-                },
-                {
-                    "itag": "140",  # Default for audio
-                    "mimeType": "audio/mp4",
-                    "qualityLabel": "Audio Only",
-                    "bitrate": 128000,
-                    "hasVideo": False,
-                    "hasAudio": True,
-                    "container": "mp4",
-                    "contentLength": "0"
-                }
-            ]
-            
             response = {
                 "videoId": video_id,
                 "title": oembed_data.get('title', 'Unknown Title'),
@@ -182,14 +327,20 @@ def get_video_info():
                 "lengthSeconds": "0",  # Not available from oEmbed
                 "viewCount": "0",  # Not available from oEmbed
                 "thumbnailUrl": oembed_data.get('thumbnail_url', ''),
-                "formats": formats
+                "formats": _FALLBACK_FORMATS
             }
             
             logger.info(f"Successfully fetched limited video info from oEmbed for: {response['title']}")
             
-            return jsonify(response)
+            # Placeholder data, so don't let clients or proxies cache it
+            fallback_response = jsonify(response)
+            fallback_response.headers['Cache-Control'] = 'no-store'
+            return fallback_response
         except Exception as oembed_error:
-            logger.error(f"oEmbed API error: {str(oembed_error)}")
+            if isinstance(oembed_error, requests.Timeout):
+                logger.error(f"oEmbed API timed out: {str(oembed_error)}")
+            else:
+                logger.error(f"oEmbed API error: {str(oembed_error)}")
             return jsonify({"error": f"Failed to fetch video information: {str(e)}"}), 500
 
 @app.route('/api/download', methods=['GET'])
@@ -239,7 +390,7 @@ def direct_download():
     
     try:
         # Create a safe filename
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        timestamp = time.strftime("%Y%m%d%H%M%S")
         filename = f"youtube_{video_id}_{timestamp}.{format_type}"
         
         # For demonstration, we'll use a direct download service
@@ -260,4 +411,4 @@ def direct_download():
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app.run(host='0.0.0.0', port=5000)